@@ -0,0 +1,163 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# Assembler runner helpers
+#
+# Runs `as` on a piece of assembly and extracts the raw .text section.
+# Assembler outputs go to anonymous memory files (memfd) which the assembler
+# opens through /proc/self/fd, or to a private tmpfs scratch directory where
+# memfd is not available. The .text section is read straight from the ELF
+# object, no objcopy or disk-backed temporary files are involved.
+#
+# Processes are started using posix_spawn (vfork semantics, no Python code
+# running in the child) with a prebuilt argv and environment. Their stdin,
+# stderr and output are memfds that every thread allocates once and reuses.
+
+import subprocess, os, hashlib, shutil, struct, tempfile, atexit, glob, threading, re, collections
+
+MEMFD = hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+SPAWN = MEMFD and hasattr(os, "posix_spawn")
+
+_scratch = None
+
+# Private scratch directory, removed at exit. Directories left behind by
+# processes that died (ie. killed) are cleaned up by the next run.
+def scratchdir():
+  global _scratch
+  if _scratch is None:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    for dn in glob.glob(os.path.join(base, "as-test-*")):
+      try:
+        os.kill(int(dn.split("-")[-2]), 0)
+      except ProcessLookupError:
+        shutil.rmtree(dn, True)
+      except (ValueError, PermissionError):
+        pass
+    _scratch = tempfile.mkdtemp(prefix="as-test-%d-" % os.getpid(), dir=base)
+    atexit.register(shutil.rmtree, _scratch, True)
+  return _scratch
+
+class Launcher(object):
+  def __init__(self, asexec):
+    self.path = shutil.which(asexec) or asexec
+    # Output goes to fd 3 (the output memfd) in the child
+    self.argv = [self.path, '-o', '/proc/self/fd/3']
+    self.env = dict(os.environ)
+
+  # Runs the assembler, returns (exit_code, object, stderr)
+  # The object contents are None if the assembler failed.
+  def run(self, source):
+    if not SPAWN:
+      return self.popen(source)
+
+    bufs = _iobufs()
+    data = source.encode("ascii")
+    # The child shares the file offsets, rewind them all
+    for fd in (bufs.stdin, bufs.stderr, bufs.out):
+      os.ftruncate(fd, 0)
+      os.lseek(fd, 0, os.SEEK_SET)
+    os.pwrite(bufs.stdin, data, 0)
+
+    pid = os.posix_spawn(self.path, self.argv, self.env, file_actions=[
+      (os.POSIX_SPAWN_DUP2, bufs.stdin, 0),
+      (os.POSIX_SPAWN_DUP2, bufs.devnull, 1),
+      (os.POSIX_SPAWN_DUP2, bufs.stderr, 2),
+      (os.POSIX_SPAWN_DUP2, bufs.out, 3),
+    ])
+    exit_code = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+
+    obj = _readall(bufs.out) if exit_code == 0 else None
+    return (exit_code, obj, _readall(bufs.stderr).decode("utf-8", "replace"))
+
+  # Fallback using subprocess and a scratch directory file
+  def popen(self, source):
+    fd, fn = tempfile.mkstemp(dir=scratchdir())
+    os.close(fd)
+    try:
+      p = subprocess.Popen([self.path, '-o', fn],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+      outp = p.communicate(input=source.encode("ascii"))
+      exit_code = p.wait()
+      obj = open(fn, "rb").read() if exit_code == 0 else None
+    finally:
+      if os.path.exists(fn):
+        os.unlink(fn)
+    return (exit_code, obj, outp[1].decode("utf-8", "replace"))
+
+_tls = threading.local()
+_launchers = {}
+
+# Per thread reusable memfds for the child stdio and output. They are closed
+# once the thread exits (and its thread-local data is released).
+class _IOBufs(object):
+  def __init__(self):
+    self.stdin = os.memfd_create("as-stdin")
+    self.stderr = os.memfd_create("as-stderr")
+    self.out = os.memfd_create("as-out")
+    self.devnull = os.open(os.devnull, os.O_WRONLY | os.O_CLOEXEC)
+
+  def __del__(self):
+    for fd in (self.stdin, self.stderr, self.out, self.devnull):
+      os.close(fd)
+
+def _iobufs():
+  if not hasattr(_tls, "bufs"):
+    _tls.bufs = _IOBufs()
+  return _tls.bufs
+
+def _readall(fd):
+  return os.pread(fd, os.fstat(fd).st_size, 0)
+
+def launcher(asexec):
+  if asexec not in _launchers:
+    _launchers[asexec] = Launcher(asexec)
+  return _launchers[asexec]
+
+# Returns the contents of the .text section of an ELF object
+def elftext(data):
+  e = "<" if data[5] == 1 else ">"
+  if data[4] == 1:
+    shoff, = struct.unpack_from(e + "I", data, 0x20)
+    shentsize, shnum, shstrndx = struct.unpack_from(e + "HHH", data, 0x2E)
+    shfmt = e + "IIIIIIIIII"
+  else:
+    shoff, = struct.unpack_from(e + "Q", data, 0x28)
+    shentsize, shnum, shstrndx = struct.unpack_from(e + "HHH", data, 0x3A)
+    shfmt = e + "IIQQQQIIQQ"
+
+  # (name, type, flags, addr, offset, size, link, info, align, entsize)
+  secs = [struct.unpack_from(shfmt, data, shoff + i * shentsize) for i in range(shnum)]
+  strs = secs[shstrndx][4]
+  for sec in secs:
+    name = data[strs + sec[0]:data.index(b"\0", strs + sec[0])]
+    if name == b".text":
+      return b"\0" * sec[5] if sec[1] == 8 else data[sec[4]:sec[4] + sec[5]]
+  return b""
+
+# Assembles the input and returns (exit_code, text, stderr)
+# The .text contents are None if the assembler failed.
+def assemble(asexec, source):
+  exit_code, obj, errors = launcher(asexec).run(source)
+  return (exit_code, elftext(obj) if obj is not None else None, errors)
+
+# Returns the error messages reported by gas, indexed by line number
+def errorlines(errors):
+  ret = collections.defaultdict(list)
+  for m in re.finditer(r"^\{standard input\}:(\d+): Error: (.*)$", errors, re.M):
+    ret[int(m.group(1))].append(m.group(2))
+  return ret
+
+# Content hash of an executable (looked up in PATH if needed)
+def binhash(asexec):
+  h = hashlib.sha256()
+  with open(shutil.which(asexec) or asexec, "rb") as fd:
+    for blk in iter(lambda: fd.read(1 << 20), b""):
+      h.update(blk)
+  return h.hexdigest()
+
+# Per assembler cache directory, keyed by the executable contents
+def cachedir(asexec):
+  base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+  dn = os.path.join(base, "vfputest", binhash(asexec))
+  os.makedirs(dn, exist_ok=True)
+  return dn
@@ -0,0 +1,54 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# Assembler batch size autotuner
+#
+# Gas has a fixed startup cost, and its per-line cost might grow with the
+# input size. This measures the throughput (tests per second) of a given
+# assembler binary at different batch sizes and picks the best one. Results
+# are stored in the per assembler cache directory (keyed by the binary
+# contents and the host), so they are re-calibrated when the binary changes.
+
+import json, os, random, socket, time
+
+import asrun, vfpucorpus
+
+SIZES = [1, 4, 16, 64, 256, 1024, 4096, 16384, 65536]
+
+# Measures the throughput for every batch size, returns {size: tests/s}
+def measure(asexec, tests, mintime=0.3):
+  rnd = random.Random(0)
+  sample = rnd.sample(tests, min(len(tests), SIZES[-1]))
+  ret = {}
+  for size in SIZES:
+    if size > len(sample):
+      break
+    source = vfpucorpus.mkasm(sample[:size], 1)
+    runs, start = 0, time.time()
+    while runs == 0 or time.time() - start < mintime:
+      asrun.assemble(asexec, source)
+      runs += 1
+    ret[size] = size * runs / (time.time() - start)
+  return ret
+
+# Returns the best batch size for the assembler and the given kind of tests
+# (name), calibrating it if needed. Calibration must happen on an idle host,
+# so suites call this when they are built, before jobsched.run() starts.
+def batchsize(asexec, name, tests, refresh=False):
+  fn = os.path.join(asrun.cachedir(asexec), "batch-%s.json" % socket.gethostname())
+  cache = {}
+  if os.path.exists(fn):
+    with open(fn) as fd:
+      cache = json.load(fd)
+
+  if refresh or name not in cache:
+    tput = measure(asexec, tests)
+    best = max(tput, key=tput.get)
+    print("Batch size calibration for %s (%s): %s, using %d" % (asexec, name,
+          ", ".join("%d: %.0f/s" % (s, t) for s, t in sorted(tput.items())), best))
+    cache[name] = {"size": best, "throughput": tput}
+    with open(fn + ".tmp", "w") as fd:
+      json.dump(cache, fd)
+    os.rename(fn + ".tmp", fn)
+
+  return cache[name]["size"]
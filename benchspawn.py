@@ -0,0 +1,42 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# Assembler launcher benchmark
+#
+# Compares the cost of invoking `as` on a single instruction using the old
+# subprocess.Popen path (three pipes and a /tmp output file) against the
+# posix_spawn based launcher in asrun.py.
+
+import argparse, os, subprocess, time, uuid
+from concurrent import futures
+
+import asrun
+
+parser = argparse.ArgumentParser(prog='benchspawn')
+parser.add_argument('--assembler', dest='asexec', required=True, help='Path (or executable within PATH) to invoke for `as`')
+parser.add_argument('--runs', dest='runs', type=int, default=1000, help='Number of assembler invocations per method')
+parser.add_argument('--threads', dest='threads', type=int, default=1, help='Number of concurrent invocations')
+parser.add_argument('--input', dest='input', default='vadd.s S000, S000, S000', help='Assembly to feed to `as`')
+args = parser.parse_args()
+
+source = args.input + "\n"
+
+def popen():
+  fn = "/tmp/as-test-%s" % str(uuid.uuid4())
+  p = subprocess.Popen([args.asexec, '-o', fn],
+    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  p.communicate(input=source.encode("ascii"))
+  p.wait()
+  if os.path.exists(fn):
+    open(fn, "rb").read()
+    os.unlink(fn)
+
+def launcher():
+  asrun.launcher(args.asexec).run(source)
+
+tp = futures.ThreadPoolExecutor(args.threads)
+for name, func in [("Popen", popen), ("posix_spawn", launcher)]:
+  start = time.time()
+  list(tp.map(lambda _: func(), range(args.runs)))
+  elapsed = time.time() - start
+  print("%-12s %8.1f runs/s %8.1f us/run" % (name, args.runs / elapsed, 1e6 * elapsed / args.runs))
@@ -0,0 +1,82 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# VFPU multi-assembler compare tool
+#
+# Generates the comparetestgood.py corpus once and assembles it with any
+# number of `as` executables in parallel. Outputs are split per test and
+# hashed in chunks, so assemblers are compared by hash (each one is only
+# run once) producing a pairwise agreement matrix and per family divergences.
+
+import argparse, hashlib, os, sys
+from concurrent import futures
+
+import vfpucorpus, asrun
+
+parser = argparse.ArgumentParser(prog='comparematrix')
+parser.add_argument('--assembler', dest='assemblers', action='append', default=[], help='Path (or executable within PATH) to invoke an `as` to compare, can be repeated')
+parser.add_argument('--legacy', dest='legacy', action='append', default=[], help='Same as --assembler but for assemblers using the reference (legacy) syntax')
+parser.add_argument('--corpus', dest='corpus', default=None, help='Use a saved (ie. minimized) corpus file instead of generating the full one')
+parser.add_argument('--strength', dest='strength', type=int, choices=[2, 3, 4], default=None, help='Generate prefix tests using t-wise covering arrays of the given strength (exhaustive by default)')
+parser.add_argument('--chunk', dest='chunk', type=int, default=1024, help='Number of tests hashed together')
+parser.add_argument('--jobs', dest='jobs', type=int, default=os.cpu_count(), help='Maximum number of assembler processes running at once')
+args = parser.parse_args()
+
+ASM = [(fn, 0) for fn in args.legacy] + [(fn, 1) for fn in args.assemblers]
+if len(ASM) < 2:
+  parser.error("At least two assemblers are needed")
+
+corpus = vfpucorpus.load(args.corpus) if args.corpus else vfpucorpus.gencorpus(args.strength)
+VTESTS = corpus.tests()
+sources = [vfpucorpus.mkasm(VTESTS, 0), vfpucorpus.mkasm(VTESTS, 1)]
+
+# Chunks never span two families: (family, first test, last test)
+chunks = []
+pos = 0
+for name, fam in corpus.families.items():
+  for i in range(0, len(fam), args.chunk):
+    chunks.append((name, pos + i, pos + min(len(fam), i + args.chunk)))
+  pos += len(fam)
+
+# Returns the list of chunk hashes (or None if assembly failed)
+def hashrun(asexec, idx):
+  exit_code, text, errors = asrun.assemble(asexec, sources[idx])
+  tchunks = vfpucorpus.splittext(text, len(VTESTS)) if exit_code == 0 else None
+  if tchunks is None:
+    print("Failed assembly (or layout mismatch) for %s\n%s" % (asexec, errors))
+    return None
+
+  return [hashlib.sha256(repr(tchunks[s:e]).encode("ascii")).digest()
+          for _, s, e in chunks]
+
+tp = futures.ThreadPoolExecutor(min(len(ASM), args.jobs))
+hashes = list(tp.map(lambda a: hashrun(*a), ASM))
+names = [fn for fn, _ in ASM]
+
+# Pairwise agreement, as a percentage of chunks with identical output
+print("Agreement matrix (%% of %d chunks of %d tests)" % (len(chunks), args.chunk))
+for i, name in enumerate(names):
+  row = []
+  for j in range(len(names)):
+    if hashes[i] is None or hashes[j] is None:
+      row.append("   --- ")
+    else:
+      same = sum(a == b for a, b in zip(hashes[i], hashes[j]))
+      row.append("%6.2f " % (100.0 * same / max(1, len(chunks))))
+  print("%2d %s %s" % (i, "".join(row), name))
+
+# Per family divergences, assemblers grouped by identical output
+diverged = False
+for fam in corpus.families:
+  idxs = [k for k, c in enumerate(chunks) if c[0] == fam]
+  groups = {}
+  for i, h in enumerate(hashes):
+    if h is not None:
+      groups.setdefault(tuple(h[k] for k in idxs), []).append(i)
+  if len(groups) > 1:
+    diverged = True
+    print("Family %s diverges: %s" % (fam, " | ".join(
+          ",".join(str(i) for i in g) for g in groups.values())))
+
+if diverged or any(h is None for h in hashes):
+  sys.exit(1)
@@ -6,133 +6,178 @@
 # This script will pair two `as` executables (model and exec under test)
 # It will assemble instructions and compare binary outputs.
 
-import argparse, re, subprocess, tempfile, os, itertools, uuid, collections
+import argparse, os, json, time, struct
 from tqdm import tqdm
-from concurrent import futures
-
-parser = argparse.ArgumentParser(prog='comparetest')
-parser.add_argument('--reference', dest='reference', required=True, help='Path (or executable within PATH) to invoke reference `as`')
-parser.add_argument('--undertest', dest='undertest', required=True, help='Path (or executable within PATH) to invoke for `as`')
-parser.add_argument('--objcopy', dest='objcopy', required=True, help='Path (or executable within PATH) to invoke MIPS objcopy')
-args = parser.parse_args()
-
-# The 2.23 toolchain has a couple bugs :)
-buggy_toolchain = frozenset([
-  "0,0,0,s", "0,0,0,c", "0,0,0,-s", "0,0,s,0",
-  "0,0,c,0", "0,0,-s,0", "0,s,0,0", "0,c,0,0",
-  "0,-s,0,0", "s,0,0,0", "c,0,0,0", "-s,0,0,0",
-])
-
-TESTS = []
-
-# vrot immediates are a paaaain
-for com in itertools.product(["0", "s", "c", "-s"], repeat=4):
-  arg = ",".join(com)
-  if arg not in buggy_toolchain:
-    TESTS.append("vrot.q R000.q, S100.s, [%s]" % arg)
-
-for com in itertools.product(["0", "s", "c", "-s"], repeat=3):
-  TESTS.append("vrot.t R000.t, S100.s, [%s]" % ",".join(com))
-
-
-# Exhaustive register naming test
-for mtx in range(9):
-  for col in range(5):
-    for row in range(5):
-      TESTS.append("vadd.s S%u%u%u.s, S000.s, S000.s" % (mtx, col, row))
-
-for mode in "ptq":
-  for mtx in range(9):
-    for col in range(5):
-      for row in range(5):
-        for t in "CRcr":
-          TESTS.append("vadd.%s %s%u%u%u.%s, %s000.%s, %s000.%s" % (
-                       mode, t, mtx, col, row, mode, t, mode, t, mode))
-
-for mode in "ptq":
-  for mtx in range(9):
-    for col in range(5):
-      for row in range(5):
-        for t in "MEme":
-          TESTS.append("vmmov.%s %s%u%u%u.%s, %s100.%s" % (
-                       mode, t, mtx, col, row, mode, t, mode))
-          # vmmul is a bit special with register VS
-          TESTS.append("vmmul.%s %s200.%s, %s%u%u%u.%s, %s100.%s" % (
-                       mode, t, mode, t, mtx, col, row, mode, t, mode))
-          TESTS.append("vmmul.%s %s200.%s, %s100.%s, %s%u%u%u.%s" % (
-                       mode, t, mode, t, mode, t, mtx, col, row, mode))
-
-# Check register collision. Should agree.
-for mode in "ptq":
-  for mtx1 in range(8):
-    for col1 in range(4):
-      for row1 in range(4):
-        for t1 in "CR":
-          for mtx2 in range(8):
-            for col2 in range(4):
-              for row2 in range(4):
-                for t2 in "CR":
-                  TESTS.append("vmmul.%s %s%u%u%u.%s, %s%u%u%u.%s, %s000.%s" % (
-                               mode, t, mtx1, col1, row1, mode, t, mtx2, col2, row2, mode, t, mode))
-                  TESTS.append("vmmul.%s %s%u%u%u.%s, %s000.%s, %s%u%u%u.%s" % (
-                               mode, t, mtx1, col1, row1, mode, t, mode, t, mtx2, col2, row2, mode))
-
-def tmpfile():
-  return "/tmp/as-test-%s" % str(uuid.uuid4())
-
-def runtest(inst):
-  oref = tmpfile()
-  otst = tmpfile()
-  bref = tmpfile()
-  btst = tmpfile()
-
-  for fn in [oref, otst, bref, btst]:
-    if os.path.exists(fn):
-      os.unlink(fn)
-
-  p1 = subprocess.Popen([args.reference, '-o', oref],
-    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-  p2 = subprocess.Popen([args.undertest, '-o', otst],
-    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-  ref_outp = p1.communicate(input=(inst + "\n").encode("ascii"))
-  aut_outp = p2.communicate(input=(inst + "\n").encode("ascii"))
-
-  p1.wait()
-  p2.wait()
-
-  ref_exit_code = p1.poll()
-  aut_exit_code = p2.poll()
 
-  if ref_exit_code != aut_exit_code:
-    print("Exit code mismatch for test `%s`" % inst)
-  elif aut_exit_code == 0:
-    # Now check that the binary output is identical
-    p1 = subprocess.Popen([args.objcopy, '-O', 'binary', '--only-section=.text', oref, bref],
-      stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    p2 = subprocess.Popen([args.objcopy, '-O', 'binary', '--only-section=.text', otst, btst],
-      stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-    p1.wait()
-    p2.wait()
-    ref_exit_code = p1.poll()
-    aut_exit_code = p2.poll()
-
-    if open(bref, "rb").read() != open(btst, "rb").read():
-      print("Mismatch binary output for test `%s`" % inst)
-
-  for fn in [oref, otst, bref, btst]:
-    if os.path.exists(fn):
-      os.unlink(fn)
+import vfpucorpus, asrun, autotune, jobsched
 
-# Invoke "as" for each test using stdin and stdout, and recording the exit code
-tp = futures.ProcessPoolExecutor(64)
-res = collections.deque()
-for inst in tqdm(TESTS):
-  res.append(tp.submit(runtest, inst))
-  while len(res) > 2048:
-    res.popleft().result()
+def runtest(args, idx, inst):
+  start = time.time()
+  ref_exit_code, ref_text, _ = asrun.assemble(args.reference, inst + "\n")
+  aut_exit_code, aut_text, _ = asrun.assemble(args.undertest, inst + "\n")
 
-while len(res) > 0:
-  res.popleft().result()
+  if ref_exit_code != aut_exit_code:
+    status = "exit-mismatch"
+  elif aut_exit_code == 0 and ref_text != aut_text:
+    status = "text-mismatch"
+  else:
+    status = "ok"
+
+  return {
+    "id": idx, "test": inst, "status": status,
+    "exit": [ref_exit_code, aut_exit_code],
+    "text": [x.hex() if x is not None else None for x in (ref_text, aut_text)],
+    "time": time.time() - start,
+  }
+
+# Runs a batch of tests in a single assembler run. Tests with errors (in
+# either assembler) are told apart using the line numbers gas reports, the
+# rest are compared using the offset index (re-assembling them if needed).
+# Per test exit codes are not known here, results carry the error flags
+# instead (whether each assembler reported an error for the test).
+def runbatch(args, batch):
+  if len(batch) == 1:
+    return [runtest(args, *batch[0])]
+
+  start = time.time()
+  insts = [inst for _, inst in batch]
+  lines = vfpucorpus.linemap(insts, 0)
+  runs = [asrun.assemble(asexec, vfpucorpus.mkasm(insts, 0))
+          for asexec in (args.reference, args.undertest)]
+
+  failed = []
+  for _, _, errors in runs:
+    errs = asrun.errorlines(errors)
+    failed.append([any(l in errs for l in range(f, e + 1)) for f, e in lines])
+
+  ret = [None] * len(batch)
+  clean = []
+  for i, (idx, inst) in enumerate(batch):
+    if failed[0][i] or failed[1][i]:
+      ret[i] = {
+        "id": idx, "test": inst,
+        "status": "exit-mismatch" if failed[0][i] != failed[1][i] else "ok",
+        "exit": None, "errors": [failed[0][i], failed[1][i]], "text": [None, None],
+      }
+    else:
+      clean.append(i)
+
+  if clean:
+    if len(clean) != len(batch) or runs[0][0] != 0 or runs[1][0] != 0:
+      cinsts = [insts[i] for i in clean]
+      runs = [asrun.assemble(asexec, vfpucorpus.mkasm(cinsts, 0))
+              for asexec in (args.reference, args.undertest)]
+    chunks = [vfpucorpus.splittext(text, len(clean)) if exit_code == 0 else None
+              for exit_code, text, _ in runs]
+
+    for n, i in enumerate(clean):
+      idx, inst = batch[i]
+      if chunks[0] is None or chunks[1] is None:
+        ret[i] = runtest(args, idx, inst)   # Unexpected failure, go one by one
+        continue
+      texts = [struct.pack("<%dI" % len(c[n]), *c[n]) for c in chunks]
+      ret[i] = {
+        "id": idx, "test": inst,
+        "status": "text-mismatch" if texts[0] != texts[1] else "ok",
+        "exit": None, "errors": [False, False], "text": [x.hex() for x in texts],
+      }
+
+  for res in ret:
+    res.setdefault("time", (time.time() - start) / len(batch))
+  return ret
+
+# Results are appended to the log as they complete. The log is flushed on
+# every result and synced to disk every few seconds. Failed tests are also
+# kept, to estimate the mismatch rates of a sampled run.
+class ResultLog(object):
+  def __init__(self, fn, resume, fsync):
+    self.done = set()
+    self.failed = set()
+    self.corpus, self.weights = None, None
+    if resume and os.path.exists(fn):
+      with open(fn, "rb+") as fd:
+        # Drop a partially written last line, so that appends start clean
+        data = fd.read()
+        data = data[:data.rfind(b"\n") + 1]
+        fd.truncate(len(data))
+      for line in data.splitlines():
+        try:
+          res = json.loads(line)
+        except ValueError:
+          continue   # Corrupted line, test will be run again
+        self.done.add(res["test"])
+        if res["status"] != "ok":
+          self.failed.add(res["test"])
+      print("Resuming, %d tests already done" % len(self.done))
+
+    self.log = open(fn, "a" if resume else "w") if fn else None
+    self.fsync = fsync
+    self.lastsync = time.time()
+
+  def report(self, results):
+    if self.log:
+      for res in results:
+        self.log.write(json.dumps(res) + "\n")
+      self.log.flush()
+      if time.time() - self.lastsync >= self.fsync:
+        os.fsync(self.log.fileno())
+        self.lastsync = time.time()
+
+    ret = []
+    for res in results:
+      if res["status"] != "ok":
+        self.failed.add(res["test"])
+      if res["status"] == "exit-mismatch":
+        ret.append("Exit code mismatch for test `%s`" % res["test"])
+      elif res["status"] == "text-mismatch":
+        ret.append("Mismatch binary output for test `%s`" % res["test"])
+    return ret
+
+  def close(self):
+    if self.log:
+      os.fsync(self.log.fileno())
+      self.log.close()
+    if self.weights is not None:
+      print("Sampled run, mismatch rate upper bounds (95% confidence):")
+      print(vfpucorpus.samplereport(self.corpus, self.weights, self.failed), end="")
+
+def add_arguments(parser):
+  parser.add_argument('--log', dest='log', default=None, help='Path to a JSON-lines file where test results are appended')
+  parser.add_argument('--resume', dest='resume', action='store_true', help='Reload the results log and skip tests already done')
+  parser.add_argument('--fsync', dest='fsync', type=float, default=2.0, help='Max seconds between results log syncs')
 
+# Invoke "as" for each test using stdin and stdout, and recording the exit code
+def jobs(args, log, TESTS, size):
+  pending = [(idx, inst) for idx, inst in enumerate(TESTS) if inst not in log.done]
+  for i in tqdm(range(0, len(pending), size)):
+    yield jobsched.Job(runbatch, args, pending[i:i+size], ntests=len(pending[i:i+size]))
+
+def suite(args):
+  if args.resume and not args.log:
+    raise SystemExit("--resume requires --log")
+  log = ResultLog(args.log, args.resume, args.fsync)
+  corpus = vfpucorpus.genindividual()
+  print(corpus.dupreport(), end="")
+  if args.sample:
+    corpus, log.weights = vfpucorpus.sample(corpus, args.sample, args.seed, args.samplemin)
+    log.corpus = corpus
+  TESTS = corpus.tests()
+
+  # Calibrated here, before any suite starts running jobs
+  size = args.batch
+  if size == "auto":
+    size = autotune.batchsize(args.undertest, "comparetest", TESTS)
+  size = size or max(1, len(TESTS))
+  return jobsched.Suite("comparetest", jobs(args, log, TESTS, size), log.report, log.close)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(prog='comparetest')
+  parser.add_argument('--reference', dest='reference', required=True, help='Path (or executable within PATH) to invoke reference `as`')
+  parser.add_argument('--undertest', dest='undertest', required=True, help='Path (or executable within PATH) to invoke for `as`')
+  parser.add_argument('--objcopy', dest='objcopy', default=None, help='Unused, the .text section is read directly (kept for compatibility)')
+  jobsched.add_arguments(parser)
+  add_arguments(parser)
+  vfpucorpus.add_sample_arguments(parser)
+  args = parser.parse_args()
+
+  jobsched.run([suite(args)], args.jobs, args.maxmem)
@@ -0,0 +1,145 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# VFPU corpus coverage and minimization tool
+#
+# Assembles the full corpus with the reference `as` and decodes every word
+# into its VFPU encoding fields. Coverage (field values and field pairs) is
+# tracked per test family using bitsets, and a minimized corpus that keeps
+# the exact same coverage is written out. The minimized corpus is assembled
+# again on its own to check that its coverage matches.
+
+import argparse, itertools, sys
+import numpy as np
+
+import vfpucorpus, asrun
+
+parser = argparse.ArgumentParser(prog='corpusmin')
+parser.add_argument('--reference', dest='reference', required=True, help='Path (or executable within PATH) to invoke reference `as`')
+parser.add_argument('--output', dest='output', required=True, help='Path to write the minimized corpus to')
+parser.add_argument('--report', dest='report', default=None, help='Path to write the coverage report to (defaults to stdout)')
+args = parser.parse_args()
+
+# Primary opcodes that carry a 16 bit immediate (lv/sv offsets, branches,
+# viim/vfim and vsync/vflush) and the ones that hold prefix bits.
+IMMOPS = [0x12, 0x32, 0x35, 0x36, 0x3A, 0x3D, 0x3E, 0x3F]
+PFXOPS = [0xDC, 0xDD, 0xDE]
+
+def decode(words):
+  w = words.astype(np.int64)
+  prim = w >> 26
+  hasimm = np.isin(prim, IMMOPS) | ((w >> 24) == 0xDF)
+  haspfx = np.isin(w >> 24, PFXOPS)
+  # Fields are (name, values, bits), with -1 marking a missing field
+  return [
+    ("op",   w >> 23, 9),
+    ("size", ((w >> 7) & 1) | ((w >> 14) & 2), 2),
+    ("vd",   w & 0x7f, 7),
+    ("vs",   (w >> 8) & 0x7f, 7),
+    ("vt",   (w >> 16) & 0x7f, 7),
+    ("imm",  np.where(hasimm, w & 0xffff, -1), 16),
+    ("pfx",  np.where(haspfx, w & 0xfffff, -1), 20),
+  ]
+
+# Field pairs are only tracked for the small register/opcode fields
+PAIRS = ["op", "size", "vd", "vs", "vt"]
+
+# Returns an array (words x features) of feature indices within the family
+# bitset, plus the bitset size. Missing features are -1.
+def features(words):
+  fields = decode(words)
+  cols, base = [], 0
+  for name, vals, bits in fields:
+    cols.append(np.where(vals >= 0, vals + base, -1))
+    base += 1 << bits
+
+  byname = dict((name, (vals, bits)) for name, vals, bits in fields)
+  for f1, f2 in itertools.combinations(PAIRS, 2):
+    v1, b1 = byname[f1]
+    v2, b2 = byname[f2]
+    cols.append((v1 << b2) + v2 + base)
+    base += 1 << (b1 + b2)
+
+  return np.stack(cols, axis=1), base
+
+def bitset(feats, size):
+  bits = np.zeros(size, dtype=bool)
+  bits[feats[feats >= 0]] = True
+  return np.packbits(bits)
+
+def popcount(bset):
+  return int(np.unpackbits(bset).sum())
+
+
+corpus = vfpucorpus.gencorpus()
+tests = corpus.tests()
+
+exit_code, text, errors = asrun.assemble(args.reference, vfpucorpus.mkasm(tests, 0))
+if exit_code != 0:
+  sys.exit("Reference assembly failed!\n" + errors)
+
+chunks = vfpucorpus.splittext(text, len(tests))
+if chunks is None:
+  sys.exit("Could not split the reference output into tests")
+
+# Family bitsets (features and pairs) from the reference output of a corpus
+def coverage(corpus, chunks):
+  ret, pos = {}, 0
+  for name, fam in corpus.families.items():
+    rng = range(pos, pos + len(fam))
+    words = np.array([w for i in rng for w in chunks[i]], dtype=np.uint32)
+    feats, size = features(words)
+    ret[name] = bitset(feats, size)
+    pos += len(fam)
+  return ret
+
+full = coverage(corpus, chunks)
+stats = {}
+
+minimized = vfpucorpus.Corpus()
+pos = 0
+for name, fam in corpus.families.items():
+  rng = range(pos, pos + len(fam))
+  words = np.array([w for i in rng for w in chunks[i]], dtype=np.uint32)
+  tidx = np.array([i for i in rng for _ in chunks[i]], dtype=np.int64)
+  feats, size = features(words)
+
+  # Keep the first test that hits every feature, this is a single greedy
+  # pass in corpus order which preserves the whole family coverage.
+  flat = feats.ravel()
+  valid = flat >= 0
+  _, first = np.unique(flat[valid], return_index=True)
+  keep = np.unique(tidx[np.nonzero(valid)[0][first] // feats.shape[1]])
+
+  npair = len(PAIRS) * (len(PAIRS) - 1) // 2
+  nsingle = popcount(bitset(feats[:, :-npair], size))
+  stats[name] = (len(fam), len(keep), len(words), nsingle, popcount(full[name]) - nsingle)
+
+  dst = minimized.family(name)
+  for i in keep:
+    dst.append(tests[i])
+  pos += len(fam)
+
+# Assemble the minimized corpus on its own, and check that it really covers
+# the same features as the full one.
+mtests = minimized.tests()
+exit_code, text, errors = asrun.assemble(args.reference, vfpucorpus.mkasm(mtests, 0))
+if exit_code != 0:
+  sys.exit("Reference assembly of the minimized corpus failed!\n" + errors)
+mchunks = vfpucorpus.splittext(text, len(mtests))
+if mchunks is None:
+  sys.exit("Could not split the minimized corpus reference output into tests")
+mincov = coverage(minimized, mchunks)
+
+report = open(args.report, "w") if args.report else sys.stdout
+report.write("%-16s %8s %8s %8s %10s %10s  %s\n" % (
+             "family", "tests", "kept", "words", "features", "pairs", "preserved"))
+for name in corpus.families:
+  report.write("%-16s %8d %8d %8d %10d %10d  %s\n" % ((name,) + stats[name] +
+               ("yes" if np.array_equal(full[name], mincov[name]) else "NO",)))
+
+report.write("Total: %d tests, %d kept (%.2f%%)\n" % (
+             len(tests), len(minimized), 100.0 * len(minimized) / max(1, len(tests))))
+vfpucorpus.save(minimized, args.output)
+if any(not np.array_equal(full[name], mincov[name]) for name in corpus.families):
+  sys.exit(1)
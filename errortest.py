@@ -5,12 +5,12 @@
 #
 # This script will validate that `as` produces errors on certain conditions
 # For intance: invalid register names, register conflicts, etc.
+# Besides the hand-picked tests, a generated negative corpus can be run
+# (see vfpucorpus.generrors), its failures are reported per rule.
 
-import argparse, re, subprocess
+import argparse, re, collections
 
-parser = argparse.ArgumentParser(prog='errortest')
-parser.add_argument('--assembler', dest='asexec', required=True, help='Path (or executable within PATH) to invoke for `as`')
-args = parser.parse_args()
+import asrun, autotune, jobsched, vfpucorpus
 
 TESTS = [
   ("vadd.s W000, W000, W000",    "invalid operand"),
@@ -105,28 +105,80 @@ TESTS = [
 
 
 # Invoke "as" for each test using stdin and stdout, and recording the exit code
-for inst, errexp in TESTS:
-  p = subprocess.Popen([args.asexec],
-    stdin=subprocess.PIPE,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.PIPE)
-
-  outp = p.communicate(input=(inst + "\n").encode("ascii"))
-  p.wait()
-  exit_code = p.poll()
+def runtest(asexec, inst, errexp):
+  exit_code, _, errors = asrun.launcher(asexec).run(inst + "\n")
 
   if errexp is None:
     if exit_code != 0:
-      print("Test `%s` failed: unexpected error when none was expected" % inst)
-      print(outp[1])
+      return ["Test `%s` failed: unexpected error when none was expected\n%s" % (inst, errors)]
   else:
     if exit_code == 0:
-      print("Test `%s` failed: expected an error but exit code is zero" % inst)
+      return ["Test `%s` failed: expected an error but exit code is zero" % inst]
     else:
       # Match the error code regex
-      if not re.search(errexp, outp[1].decode("utf-8")):
-        print("Output mismatch in test `%s`!" % inst)
-        print(outp[1])
-
-
-
+      if not re.search(errexp, errors):
+        return ["Output mismatch in test `%s`!\n%s" % (inst, errors)]
+  return []
+
+# Generated negative tests are run in batches, one instruction per line.
+# Diagnostics are matched to the tests using the line number gas reports.
+def runbatch(asexec, cases):
+  exit_code, _, errors = asrun.launcher(asexec).run("\n".join(inst for _, inst in cases) + "\n")
+
+  perline = asrun.errorlines(errors)
+
+  ret = []
+  for i, (rule, inst) in enumerate(cases):
+    errs = perline.get(i + 1)
+    if not errs:
+      ret.append((rule, "Test `%s` failed: expected an error but got none" % inst))
+    elif not any(re.search(vfpucorpus.ERRRULES[rule], e) for e in errs):
+      ret.append((rule, "Output mismatch in test `%s`: %s" % (inst, "; ".join(errs))))
+  return ret
+
+class RuleReport(object):
+  def __init__(self, corpus):
+    self.cases = dict((name, len(fam)) for name, fam in corpus.families.items())
+    self.failures = collections.defaultdict(list)
+
+  def report(self, res):
+    for rule, msg in res:
+      self.failures[rule].append(msg)
+    return ["[%s] %s" % (rule, msg) for rule, msg in res]
+
+  def finish(self):
+    print("%-20s %10s %10s" % ("rule", "cases", "failures"))
+    for rule, cnt in self.cases.items():
+      print("%-20s %10d %10d" % (rule, cnt, len(self.failures[rule])))
+
+def jobs(args):
+  for inst, errexp in TESTS:
+    yield jobsched.Job(runtest, args.asexec, inst, errexp)
+
+def genjobs(args, cases, size):
+  for i in range(0, len(cases), size):
+    batch = cases[i:i+size]
+    yield jobsched.Job(runbatch, args.asexec, batch, ntests=len(batch))
+
+def suite(args):
+  return jobsched.Suite("errortest", jobs(args), lambda res: res)
+
+def gensuite(args):
+  corpus = vfpucorpus.generrors()
+  cases = list(corpus.items())
+  # Calibrated here, before any suite starts running jobs
+  size = args.batch
+  if size == "auto":
+    size = autotune.batchsize(args.asexec, "errorgen", [inst for _, inst in cases])
+  size = size or max(1, len(cases))
+  rep = RuleReport(corpus)
+  return jobsched.Suite("errorgen", genjobs(args, cases, size), rep.report, rep.finish, maxprint=50)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(prog='errortest')
+  parser.add_argument('--assembler', dest='asexec', required=True, help='Path (or executable within PATH) to invoke for `as`')
+  parser.add_argument('--generated', dest='generated', action='store_true', help='Also run the generated negative tests')
+  jobsched.add_arguments(parser)
+  args = parser.parse_args()
+
+  jobsched.run([suite(args)] + ([gensuite(args)] if args.generated else []), args.jobs, args.maxmem)
@@ -0,0 +1,133 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# Test job scheduler
+#
+# Test suites are exposed as job sources (an iterable of Job objects).
+# Jobs from all sources share a global budget of concurrent processes and
+# memory. Suites are drained in the order given, so that short suites can go
+# first and report errors early.
+
+import argparse, os, threading, time
+from concurrent import futures
+
+class Job(object):
+  # func(*fargs) runs the job (in a worker thread) and returns a result
+  # that the suite report() function will turn into failure messages.
+  # procs and mem are an estimate of the processes and memory it uses.
+  def __init__(self, func, *fargs, ntests=1, procs=1, mem=32 << 20):
+    self.func = func
+    self.fargs = fargs
+    self.ntests = ntests
+    self.procs = procs
+    self.mem = mem
+
+  def run(self):
+    return self.func(*self.fargs)
+
+class Budget(object):
+  def __init__(self, procs, memory=None):
+    self.procs = procs
+    self.memory = memory
+    self.used = [0, 0]
+    self.running = 0
+    self.cond = threading.Condition()
+
+  def fits(self, job):
+    # Jobs that do not fit anyway are allowed to run alone
+    if self.running == 0:
+      return True
+    if self.used[0] + job.procs > self.procs:
+      return False
+    return self.memory is None or self.used[1] + job.mem <= self.memory
+
+  def acquire(self, job):
+    with self.cond:
+      while not self.fits(job):
+        self.cond.wait()
+      self.used[0] += job.procs
+      self.used[1] += job.mem
+      self.running += 1
+
+  def release(self, job):
+    with self.cond:
+      self.used[0] -= job.procs
+      self.used[1] -= job.mem
+      self.running -= 1
+      self.cond.notify_all()
+
+class Suite(object):
+  # report(result) returns the failure messages, at most maxprint of them
+  # are printed. finish() is invoked once all the jobs are done.
+  def __init__(self, name, jobs, report, finish=None, maxprint=None):
+    self.name = name
+    self.jobs = jobs
+    self.report = report
+    self.finish = finish
+    self.maxprint = maxprint
+    self.ntests = 0
+    self.failures = 0
+    self.start = None
+    self.end = None
+
+# Runs all the suites (in priority order) and prints a summary.
+# Returns the number of failures.
+def run(suites, procs, memory=None):
+  budget = Budget(procs, memory)
+  tp = futures.ThreadPoolExecutor(procs)
+  pending = {}
+
+  def runjob(job):
+    try:
+      return job.run()
+    finally:
+      budget.release(job)
+
+  def collect(done):
+    for f in done:
+      suite, job = pending.pop(f)
+      suite.ntests += job.ntests
+      for msg in suite.report(f.result()):
+        suite.failures += 1
+        if suite.maxprint is None or suite.failures <= suite.maxprint:
+          print("[%s] %s" % (suite.name, msg))
+      suite.end = time.time()
+
+  for suite in suites:
+    suite.start = time.time()
+    for job in suite.jobs:
+      budget.acquire(job)
+      pending[tp.submit(runjob, job)] = (suite, job)
+      collect([f for f in list(pending) if f.done()])
+
+  while pending:
+    done, _ = futures.wait(list(pending), return_when=futures.FIRST_COMPLETED)
+    collect(done)
+  tp.shutdown()
+
+  for suite in suites:
+    if suite.finish:
+      suite.finish()
+
+  print("%-20s %10s %10s %10s" % ("suite", "tests", "failures", "time (s)"))
+  for suite in suites:
+    print("%-20s %10d %10d %10.1f" % (suite.name, suite.ntests, suite.failures,
+                                      (suite.end or suite.start) - suite.start))
+  return sum(suite.failures for suite in suites)
+
+# Parses a --batch value: "auto" or a number of tests (0 for a single batch)
+def batcharg(value):
+  if value == "auto":
+    return value
+  try:
+    ret = int(value)
+  except ValueError:
+    ret = -1
+  if ret < 0:
+    raise argparse.ArgumentTypeError("expected \"auto\" or a number of tests, got %r" % value)
+  return ret
+
+def add_arguments(parser):
+  parser.add_argument('--jobs', dest='jobs', type=int, default=os.cpu_count(), help='Maximum number of assembler processes running at once')
+  parser.add_argument('--batch', dest='batch', type=batcharg, default="auto", help='Number of tests per assembler run (0 runs them all at once), "auto" calibrates it for the assembler binary')
+  parser.add_argument('--max-memory', dest='maxmem', type=lambda x: int(x) << 20, default=None, help='Memory ceiling (in MB) for all running jobs')
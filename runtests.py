@@ -0,0 +1,44 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# VFPU test driver
+#
+# Runs all the test suites (errortest, its generated negative tests,
+# comparetestgood and comparetest) sharing a single process and memory
+# budget. Suites run shortest first, so that errors show up early, and a
+# consolidated summary is printed at the end.
+
+import argparse, sys
+
+import jobsched, vfpucorpus, errortest, comparetestgood, comparetest
+
+SUITES = [
+  ("errortest", errortest, errortest.suite),
+  ("errorgen", errortest, errortest.gensuite),
+  ("comparetestgood", comparetestgood, comparetestgood.suite),
+  ("comparetest", comparetest, comparetest.suite),
+]
+
+parser = argparse.ArgumentParser(prog='runtests')
+parser.add_argument('--reference', dest='reference', required=True, help='Path (or executable within PATH) to invoke reference `as`')
+parser.add_argument('--undertest', dest='undertest', required=True, help='Path (or executable within PATH) to invoke for `as`')
+parser.add_argument('--objcopy', dest='objcopy', default=None, help='Unused, the .text section is read directly (kept for compatibility)')
+parser.add_argument('--suites', dest='suites', default=",".join(s[0] for s in SUITES), help='Comma separated list of suites to run')
+jobsched.add_arguments(parser)
+vfpucorpus.add_sample_arguments(parser)
+for mod in set(s[1] for s in SUITES):
+  if hasattr(mod, "add_arguments"):
+    mod.add_arguments(parser)
+args = parser.parse_args()
+
+# errortest validates the assembler under test
+args.asexec = args.undertest
+
+enabled = args.suites.split(",")
+for name in enabled:
+  if name not in [s[0] for s in SUITES]:
+    parser.error("Unknown suite %s" % name)
+
+suites = [factory(args) for name, _, factory in SUITES if name in enabled]
+if jobsched.run(suites, args.jobs, args.maxmem):
+  sys.exit(1)
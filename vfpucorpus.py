@@ -0,0 +1,765 @@
+
+# Copyright 2021 David Guillen Fandos <david@davidgf.net>
+
+# VFPU test corpus
+#
+# Operand tables and instruction generators shared by the test scripts.
+# Tests are grouped in families (one per generator loop) so that they can
+# be reported, minimized and sampled independently.
+#
+# A test is either a string or a tuple of two strings, the latter being used
+# for instructions which syntax differs between the reference and the
+# assembler under test (reference syntax first).
+
+import collections, hashlib, itertools, json, math, random, struct
+
+ALLCNT = [
+  "VFPU_HUGE",
+  "VFPU_SQRT2",
+  "VFPU_SQRT1_2",
+  "VFPU_2_SQRTPI",
+  "VFPU_2_PI",
+  "VFPU_1_PI",
+  "VFPU_PI_4",
+  "VFPU_PI_2",
+  "VFPU_PI",
+  "VFPU_E",
+  "VFPU_LOG2E",
+  "VFPU_LOG10E",
+  "VFPU_LN2",
+  "VFPU_LN10",
+  "VFPU_2PI",
+  "VFPU_PI_6",
+  "VFPU_LOG10TWO",
+  "VFPU_LOG2TEN",
+  "VFPU_SQRT3_2"
+]
+
+allrots = [
+  ["c", "s", "s", "s"],
+  ["s", "c", "0", "0"],
+  ["s", "0", "c", "0"],
+  ["s", "0", "0", "c"],
+  ["c", "s", "0", "0"],
+  ["s", "c", "s", "s"],
+  ["0", "s", "c", "0"],
+  ["0", "s", "0", "c"],
+  ["c", "0", "s", "0"],
+  ["0", "c", "s", "0"],
+  ["s", "s", "c", "s"],
+  ["0", "0", "s", "c"],
+  ["c", "0", "0", "s"],
+  ["0", "c", "0", "s"],
+  ["0", "0", "c", "s"],
+  ["s", "s", "s", "c"],
+  ["c", "-s", "-s", "-s"],
+  ["-s", "c", "0", "0"],
+  ["-s", "0", "c", "0"],
+  ["-s", "0", "0", "c"],
+  ["c", "-s", "0", "0"],
+  ["-s", "c", "-s", "-s"],
+  ["0", "-s", "c", "0"],
+  ["0", "-s", "0", "c"],
+  ["c", "0", "-s", "0"],
+  ["0", "c", "-s", "0"],
+  ["-s", "-s", "c", "-s"],
+  ["0", "0", "-s", "c"],
+  ["c", "0", "0", "-s"],
+  ["0", "c", "0", "-s"],
+  ["0", "0", "c", "-s"],
+  ["-s", "-s", "-s", "c"],
+]
+
+# 3 operand instructions, shared by the positive and negative corpora
+OPS3 = ["add", "sub", "div", "mul", "min", "max", "sge", "slt", "scmp"]
+
+def samemtx(reg1, reg2):
+  return reg1[1] == reg2[1]
+
+def genregm(mode):
+  for mtx in range(8):
+    for col in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+      for row in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+        for e in "ME":
+          yield "%s%d%d%d.%s" % (e, mtx, col, row, mode)
+
+def genregs(mode):
+  if mode == "s":
+    for com in itertools.product("0123", repeat=3):
+      yield "S%s.s" % "".join(com)
+  else:
+    for mtx in range(8):
+      for col in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+        for row in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+          for e in "RC":
+            yield "%s%d%d%d.%s" % (e, mtx, col, row, mode)
+
+def genhfloat():
+  for sign in "-+ ":
+    for sp in ["NaN", "Inf", "inf", "0"]:
+      yield sign + sp
+  for i in range(12):
+    for j in range(8):
+      yield "%f" % ((1<<i) * (j+1))
+  for i in range(8):
+    for j in range(0, 256, 13):
+      yield "%f" % ((1<<i) * (j+1) * 0.015625)
+
+def regcpu():
+  for i in range(28):
+    yield "$%d" % i
+
+def regcc():
+  for i in range(128, 143, 1):
+    yield "$%d" % i
+
+def genregs3(mode):
+  for reg in genregs(mode):
+    yield (reg,reg,reg)
+
+def genregs2(mode):
+  for reg in genregs(mode):
+    yield (reg,reg)
+
+def genregm2(mode):
+  for mtx1 in range(7):
+    for col1 in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+      for row1 in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+        for e1 in "ME":
+          for mtx2 in range(8):
+            for col2 in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+              for row2 in {"p": [0,2], "t": [0,1], "q": [0]}[mode]:
+                for e2 in "ME":
+                  if mtx1 != mtx2:
+                    yield ("%s%d%d%d.%s" % (e1, mtx1, col1, row1, mode),
+                           "%s%d%d%d.%s" % (e2, mtx2, col2, row2, mode))
+
+
+# Collapses whitespace and lowercases the mnemonic, operands keep their case
+# since some tests (ie. vcmp conditions) check both spellings on purpose.
+def canonical(test):
+  if isinstance(test, tuple):
+    return tuple(canonical(x) for x in test)
+  lines = []
+  for line in test.split("\n"):
+    words = line.split()
+    if words:
+      words[0] = words[0].lower()
+    lines.append(" ".join(words))
+  return "\n".join(lines)
+
+# Tests are canonicalized and deduplicated as they are generated. Only a
+# 64 bit digest of every test is kept around (shared across families).
+class Family(list):
+  def __init__(self, name, seen):
+    super(Family, self).__init__()
+    self.name = name
+    self.seen = seen
+    self.total = 0
+
+  def append(self, test):
+    test = canonical(test)
+    key = hashlib.blake2b(repr(test).encode("utf-8"), digest_size=8).digest()
+    self.total += 1
+    if key not in self.seen:
+      self.seen.add(key)
+      super(Family, self).append(test)
+
+  def dups(self):
+    return self.total - len(self)
+
+class Corpus(object):
+  def __init__(self):
+    self.families = collections.OrderedDict()
+    self.seen = set()
+
+  def family(self, name):
+    if name not in self.families:
+      self.families[name] = Family(name, self.seen)
+    return self.families[name]
+
+  def dupreport(self):
+    ret = ""
+    for fam in self.families.values():
+      if fam.dups():
+        ret += "%-16s %8d generated, %8d duplicates (%.1f%%)\n" % (
+               fam.name, fam.total, fam.dups(), 100.0 * fam.dups() / fam.total)
+    return ret
+
+  def items(self):
+    for fam in self.families.values():
+      for test in fam:
+        yield (fam.name, test)
+
+  def tests(self):
+    return [test for _, test in self.items()]
+
+  def __len__(self):
+    return sum(len(fam) for fam in self.families.values())
+
+def save(corpus, fn):
+  with open(fn, "w") as fd:
+    for name, test in corpus.items():
+      fd.write(json.dumps({"family": name, "test": test}) + "\n")
+
+def load(fn):
+  corpus = Corpus()
+  with open(fn) as fd:
+    for line in fd:
+      entry = json.loads(line)
+      test = entry["test"]
+      corpus.family(entry["family"]).append(tuple(test) if isinstance(test, list) else test)
+  return corpus
+
+# Instruction form of a test: the mnemonics of its lines (ie. "vpfxs/vadd.q")
+def mnemonic(test):
+  if isinstance(test, tuple):
+    test = test[1]
+  return "/".join(line.split()[0] for line in test.split("\n") if line.strip())
+
+# Stratified random sample of a corpus. Every (family, mnemonic) stratum gets
+# the same fraction of its tests, but at least `minimum` of them (or all, if
+# it is smaller). Every stratum has its own seeded generator, so a sample only
+# depends on the seed and the stratum contents. Returns the sampled corpus and
+# the weight of every sampled test (the number of tests it stands for).
+def sample(corpus, fraction, seed, minimum=3):
+  ret, weights = Corpus(), {}
+  for fam in corpus.families.values():
+    strata = collections.OrderedDict()
+    for i, test in enumerate(fam):
+      strata.setdefault(mnemonic(test), []).append(i)
+
+    picked = []
+    for mn, idxs in strata.items():
+      cnt = min(len(idxs), max(minimum, int(math.ceil(fraction * len(idxs)))))
+      rnd = random.Random("%s/%s/%s" % (seed, fam.name, mn))
+      for i in rnd.sample(idxs, cnt):
+        picked.append(i)
+        weights[fam[i]] = len(idxs) / cnt
+
+    # Keep the original test order
+    out = ret.family(fam.name)
+    for i in sorted(picked):
+      out.append(fam[i])
+  return ret, weights
+
+# Wilson score interval upper bound for a proportion p observed on n samples
+def wilson(p, n, z=1.96):
+  if n == 0:
+    return 1.0
+  d = 1 + z * z / n
+  c = p + z * z / (2 * n)
+  return min(1.0, (c + z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))) / d)
+
+# Mismatch rate estimate per family from a sampled run. The rate is weighted
+# (strata are sampled at different rates) and the bound uses Kish's effective
+# sample size for those weights.
+def samplereport(corpus, weights, failed):
+  ret = "%-16s %8s %8s %8s %10s %10s\n" % (
+        "family", "tests", "sampled", "failed", "rate (%)", "bound (%)")
+  for fam in corpus.families.values():
+    if not fam:
+      continue
+    w = [weights[test] for test in fam]
+    wfail = sum(weights[test] for test in fam if test in failed)
+    neff = sum(w) ** 2 / sum(x * x for x in w)
+    rate = wfail / sum(w)
+    ret += "%-16s %8d %8d %8d %10.4f %10.4f\n" % (
+           fam.name, round(sum(w)), len(fam), sum(test in failed for test in fam),
+           100.0 * rate, 100.0 * wilson(rate, neff))
+  return ret
+
+def add_sample_arguments(parser):
+  parser.add_argument('--sample', dest='sample', type=float, default=None, help='Run a stratified random sample (this fraction) of every test family')
+  parser.add_argument('--seed', dest='seed', type=int, default=0, help='Random seed used by --sample')
+  parser.add_argument('--sample-min', dest='samplemin', type=int, default=3, help='Minimum number of sampled tests per family and instruction form')
+
+
+# Tests are laid out with a zero word in between them. No VFPU instruction
+# encodes to zero, so the .text section can be split back into the words
+# produced by every test (the offset index).
+def mkasm(tests, idx):
+  return ".set noat\n.set noreorder\n" + "".join(
+    "%s\n.word 0\n" % (x[idx] if isinstance(x, tuple) else x) for x in tests)
+
+# Source line numbers (first, last) of every test in the mkasm() output
+def linemap(tests, idx):
+  ret, line = [], 3
+  for x in tests:
+    n = (x[idx] if isinstance(x, tuple) else x).count("\n")
+    ret.append((line, line + n))
+    line += n + 2
+  return ret
+
+def splittext(text, ntests):
+  words = struct.unpack("<%dI" % (len(text) // 4), text[:len(text) & ~3])
+  chunks, cur = [], []
+  for w in words:
+    if w == 0:
+      chunks.append(tuple(cur))
+      cur = []
+    else:
+      cur.append(w)
+
+  # Anything past the last test must be section padding
+  if len(chunks) < ntests or cur or any(chunks[ntests:]):
+    return None
+  return chunks[:ntests]
+
+
+# Builds a t-wise covering array: a list of rows (one value per parameter)
+# such that every combination of values of any t parameters shows up at
+# least once. With no strength (or t >= #params) this is the full product.
+# Rows are built greedily (AETG style): start from the first interaction not
+# covered yet and complete the row with the values covering the most.
+def covering(params, t):
+  if not t or t >= len(params):
+    return list(itertools.product(*params))
+
+  subsets = list(itertools.combinations(range(len(params)), t))
+  pending = [(sub, vals) for sub in subsets
+             for vals in itertools.product(*[range(len(params[i])) for i in sub])]
+  uncovered = set(pending)
+
+  rows, nxt = [], 0
+  while uncovered:
+    while pending[nxt] not in uncovered:
+      nxt += 1
+    sub, vals = pending[nxt]
+    row = [None] * len(params)
+    for i, v in zip(sub, vals):
+      row[i] = v
+
+    for p in range(len(params)):
+      if row[p] is not None:
+        continue
+      # Only consider interactions whose other parameters are set already
+      cands = [s for s in subsets if p in s and
+               all(row[i] is not None for i in s if i != p)]
+      def gain(v):
+        row[p] = v
+        return sum((s, tuple(row[i] for i in s)) in uncovered for s in cands)
+      best = max(range(len(params[p])), key=lambda v: (gain(v), -v))
+      row[p] = best
+
+    for s in subsets:
+      uncovered.discard((s, tuple(row[i] for i in s)))
+    rows.append(tuple(params[i][v] for i, v in enumerate(row)))
+
+  return rows
+
+def gencorpus(strength=None):
+  corpus = Corpus()
+
+  # Branch insts
+  VTESTS = corpus.family("branch")
+  for i in range(6):
+    for cond in "ft":
+      for lik in "l ":
+        VTESTS.append("bv%s%s %d, 1f\n1:" % (cond, lik, i))
+
+  # Load/Store
+  VTESTS = corpus.family("loadstore")
+  for i in range(8):
+    for op, wbmode in [("l", ""), ("s", ""), ("s", ", wb"), ("s", ", wt")]:
+      for mode, regm in [("s", "S"), ("q", "R"), ("q", "C")]:
+        for offset in range(0, 4096, 4):
+          wbm = wbmode if mode == "q" else ""
+          VTESTS.append("%sv.%s %s000, %d($4) %s" % (op, mode, regm, offset, wbm))
+          VTESTS.append("%sv.%s %s000, -%d($4) %s" % (op, mode, regm, offset, wbm))
+
+  # Prefix instructions
+  # The syntax was slightly changed since it was quite hard to parse it otherwise
+  # Prefix lanes explode quickly, use covering arrays if a strength is given.
+  VTESTS = corpus.family("pfx-swizzle")
+  for atype, regpfx, N in [("q", "R", 4), ("t", "R", 3), ("p", "R", 2), ("s", "S", 1)]:
+    availchs = ["x","y","z","w"][0:N]
+    # Every lane is a channel (with optional abs and neg) or nothing
+    lanes = ["%s%s%s%s" % (neg, ab, ch, ab)
+             for ch in availchs for ab in "| " for neg in "- "] + ["   "]
+    for row in covering([lanes] * N + ["st"], strength):
+      exp, pfxt = ",".join(row[:N]), row[N]
+      if N == 4:
+        VTESTS.append(
+          ("vpfx%s %s" % (pfxt, exp),
+          ("vpfx%s [%s]" % (pfxt, exp))))
+      VTESTS.append("vadd.%s %s000, %s100, %s200[%s]" % (atype, regpfx, regpfx, regpfx, exp))
+      VTESTS.append("vadd.%s %s000, %s100[%s], %s200" % (atype, regpfx, regpfx, exp, regpfx))
+
+  VTESTS = corpus.family("pfx-const")
+  cnts = ["x","y","z","w","","0","1","2","1/2","3","1/3","1/4","1/6"]
+  for c1,c2,c3,c4,pfxt in covering([cnts] * 4 + ["st"], strength):
+    VTESTS.append(
+      ("vpfx%s %s, %s, %s, %s" % (pfxt, c1, c2, c3, c4),
+      ("vpfx%s [%s, %s, %s, %s]" % (pfxt, c1, c2, c3, c4))))
+
+  VTESTS = corpus.family("pfx-dest")
+  for c1,c2,c3,c4 in covering([["", "m", "-1:1", "[-1:1]", "0:1", "[0:1]"]] * 4, strength):
+    VTESTS.append(
+      ("vpfxd %s,%s,%s,%s" % (c1,c2,c3,c4),
+      ("vpfxd [%s,%s,%s,%s]" % (c1,c2,c3,c4))))
+
+  VTESTS = corpus.family("pfx-dest-inline")
+  for c1,c2,c3,c4 in covering([["", "m", "-1:1", "0:1"]] * 4, strength):
+    VTESTS.append("vadd.q R000[%s,%s,%s,%s], R000, R200" % (c1,c2,c3,c4))
+
+  for atype, regpfx, N in [("q", "R", 4), ("t", "R", 3), ("p", "R", 2), ("s", "S", 1)]:
+    for chs in covering([["", "m", "-1:1", "0:1"]] * N, strength):
+      exp = ",".join([chs[i] for i in range(N)])
+      VTESTS.append("vadd.%s %s000[%s], %s100, %s200" % (atype, regpfx, exp, regpfx, regpfx))
+
+  # vrot insts are hard too, .p encoding is ambigous :)
+  VTESTS = corpus.family("vrot")
+  #for c, mode in [(2, "p"), (3, "t"), (4, "q")]:
+  for c, mode in [(3, "t"), (4, "q")]:
+    for perm in allrots:
+      for regd in genregs(mode):
+        VTESTS.append("vrot.%s %s, S733.s, [%s]" % (mode, regd, ",".join(perm[:c])))
+
+
+  # 3 operand VFPU instructions
+  VTESTS = corpus.family("3op")
+  for op in OPS3:
+    for mode in "sptq":
+      for regd, regs, regt in genregs3(mode):
+        VTESTS.append("v%s.%s %s, %s, %s" % (op, mode, regd, regs, regt))
+
+  VTESTS = corpus.family("bitops")
+  for regd in genregs("s"):
+    for regs, regt in genregs2("s"):
+      VTESTS.append("vsbn.s %s, %s, %s" % (regd, regs, regt))
+    for regs in genregs("s"):
+      for imm in range(0, 256, 17):
+        VTESTS.append("vwbn.s %s, %s, %d" % (regd, regs, imm))
+        VTESTS.append("vwbn.s %s, %s, 0x%x" % (regd, regs, imm))
+
+  VTESTS = corpus.family("vqmul")
+  for regd in genregs("q"):
+    for regs, regt in genregs2("q"):
+      if not samemtx(regd, regs) and not samemtx(regd, regt):
+        VTESTS.append("vqmul.q %s, %s, %s" % (regd, regs, regt))
+
+  VTESTS = corpus.family("dot")
+  for op in ["dot", "hdp"]:
+    for mode in "ptq":
+      for regs, regt in genregs2(mode):
+        for regd in genregs("s"):
+          VTESTS.append("v%s.%s %s, %s, %s" % (op, mode, regd, regs, regt))
+
+  VTESTS = corpus.family("cross")
+  for op in ["crs", "crsp"]:
+    for regd, regs, regt in genregs3("t"):
+      VTESTS.append("v%s.%s %s, %s, %s" % (op, "t", regd, regs, regt))
+
+  VTESTS = corpus.family("matrix-3op")
+  for mode in "ptq":
+    for regd, regs in genregm2(mode):
+      VTESTS.append("vmmul.%s %s, %s, %s" % (mode, regd, regs, regs))
+    for regd, regs in genregm2(mode):
+      for regt in ["S700.s", "S712.s", "S732.s", "S720.s", "S733.s"]:
+        VTESTS.append("vmscl.%s %s, %s, %s" % (mode, regd, regs, regt))
+    for regd, regs in genregs2(mode):
+      for regt in genregs("s"):
+        VTESTS.append("vscl.%s %s, %s, %s" % (mode, regd, regs, regt))
+
+  VTESTS = corpus.family("transform")
+  for nmode, mode in [(4, "q"), (3, "t"), (2, "p")]:
+    for regd, regt in genregs2(mode):
+      for regs in genregm(mode):
+        if not samemtx(regd, regs) and not samemtx(regd, regt):
+          VTESTS.append("vtfm%d.%s %s, %s, %s" % (nmode, mode, regd, regs, regt))
+          VTESTS.append("vhtfm%d.%s %s, %s, %s" % (nmode, mode, regd, regs, regt))
+
+  VTESTS = corpus.family("cmov-cvt")
+  for mode in "sptq":
+    for regd, regs in genregs2(mode):
+      for op in ["cmov", "cmovt", "cmovf"]:
+        for code in range(7):
+          VTESTS.append("v%s.%s %s, %s, %s" % (op, mode, regd, regs, code))
+    for regd, regs in genregs2(mode):
+      for op in "f2in", "f2iz", "f2iu", "f2id", "i2f":
+        for code in range(32):
+          VTESTS.append("v%s.%s %s, %s, %s" % (op, mode, regd, regs, code))
+
+  # 2 operand VFPU instructions
+  VTESTS = corpus.family("2op")
+  for op in ["mov", "abs", "neg", "sgn", "rcp", "rsq", "sin", "cos", "exp2", "log2", "sqrt", "asin",
+             "nrcp", "nsin", "rexp2", "ocp", "sat0", "sat1"]:
+    for mode in "sptq":
+      for regd, regs in genregs2(mode):
+        VTESTS.append("v%s.%s %s, %s" % (op, mode, regd, regs))
+
+  for op in ["bfy1"]:
+    for mode in "pq":
+      for regd, regs in genregs2(mode):
+        VTESTS.append("v%s.%s %s, %s" % (op, mode, regd, regs))
+
+  VTESTS = corpus.family("pack")
+  for dmode, smode in [("p", "q"), ("s", "p")]:
+    for regd in genregs(dmode):
+      for regs in genregs(smode):
+        for op in ["i2us", "i2s", "f2h"]:
+          VTESTS.append("v%s.%s %s, %s" % (op, smode, regd, regs))
+        for op in ["us2i", "s2i", "socp", "h2f"]:
+          VTESTS.append("v%s.%s %s, %s" % (op, dmode, regs, regd))
+
+  VTESTS = corpus.family("vdet")
+  for regd in genregs("s"):
+    for regs, regt in genregs2("p"):
+      VTESTS.append("vdet.p %s, %s, %s" % (regd, regs, regt))
+
+  VTESTS = corpus.family("pack-color")
+  for op in ["i2uc", "i2c"]:
+    for regd in genregs("s"):
+      for regs in genregs("q"):
+        VTESTS.append("v%s.q %s, %s" % (op, regd, regs))
+
+  for op in ["t4444", "t5551", "t5650"]:
+    for regd in genregs("p"):
+      for regs in genregs("q"):
+        VTESTS.append("v%s.q %s, %s" % (op, regd, regs))
+
+  VTESTS = corpus.family("sort")
+  for op in ["srt1", "srt2", "srt3", "srt4", "bfy2"]:
+    for regd, regs in genregs2("q"):
+      VTESTS.append("v%s.%s %s, %s" % (op, "q", regd, regs))
+
+  VTESTS = corpus.family("reduce")
+  for op in ["avg", "fad"]:
+    for mode in "ptq":
+      for regs in genregs(mode):
+        for regd in genregs("s"):
+          VTESTS.append("v%s.%s %s, %s" % (op, mode, regd, regs))
+
+  for op in ["sbz", "lgb"]:
+    for regd, regs in genregs2("s"):
+      VTESTS.append("v%s.s %s, %s" % (op, regd, regs))
+
+  VTESTS = corpus.family("vmmov")
+  for mode in "ptq":
+    for regd, regs in genregm2(mode):
+      VTESTS.append("vmmov.%s %s, %s" % (mode, regd, regs))
+
+  # Unary VFPU instructions
+  VTESTS = corpus.family("unary")
+  for op in ["zero", "one", "rndi", "rndf1", "rndf2"]:
+    for mode in "sptq":
+      for regd in genregs(mode):
+        VTESTS.append("v%s.%s %s" % (op, mode, regd))
+
+  for mode in "pq":
+    for regd in genregs(mode):
+      VTESTS.append("vidt.%s %s" % (mode, regd))
+
+  for op in ["zero", "one", "idt"]:
+    for mode in "ptq":
+      for regd in genregm(mode):
+        VTESTS.append("vm%s.%s %s" % (op, mode, regd))
+
+  # Special insts
+  VTESTS = corpus.family("vcst")
+  for mode in "sptq":
+    for regd in genregs(mode):
+      for ct in ALLCNT:
+        VTESTS.append("vcst.%s %s, %s" % (mode, regd, ct))
+
+  VTESTS = corpus.family("vcmp")
+  for mode in "sptq":
+    for regs, regt in genregs2(mode):
+      for ct in ["FL", "EQ", "NE", "GT", "fl", "eq", "ne", "gt"]:
+        VTESTS.append("vcmp.%s %s, %s, %s" % (mode, ct, regs, regt))
+      for ct in ["NN", "NZ", "nn", "nz"]:
+        VTESTS.append("vcmp.%s %s, %s" % (mode, ct, regs))
+      for ct in ["FL", "TR", "fl", "tr"]:
+        VTESTS.append("vcmp.%s %s" % (mode, ct))
+
+  # Immediate insts
+  VTESTS = corpus.family("immediate")
+  for regd in genregs("s"):
+    for imm in genhfloat():
+      VTESTS.append("vfim.s %s, %s" % (regd, imm))
+    for imm in range(0, 1 << 16, 13*17):
+      VTESTS.append("viim.s %s, %d" % (regd, imm))
+
+  # Interlock insts
+  VTESTS = corpus.family("transfer")
+  for cpureg in regcpu():
+    for ccreg in regcc():
+      VTESTS.append("mtvc %s, %s" % (cpureg, ccreg))
+      VTESTS.append("mfvc %s, %s" % (cpureg, ccreg))
+    for vreg in genregs("s"):
+      VTESTS.append("mtv %s, %s" % (cpureg, vreg))
+      VTESTS.append("mfv %s, %s" % (cpureg, vreg))
+
+  for ccreg in regcc():
+    for vreg in genregs("s"):
+      VTESTS.append("vmtvc %s, %s" % (ccreg, vreg))
+      VTESTS.append("vmfvc %s, %s" % (vreg, ccreg))
+
+  VTESTS = corpus.family("sync")
+  for i in range(0, 1000, 13):
+    VTESTS.append("vsync %d" % i)
+
+  VTESTS.append("vflush")
+  VTESTS.append("vsync")
+
+  return corpus
+
+
+# The 2.23 toolchain has a couple bugs :)
+buggy_toolchain = frozenset([
+  "0,0,0,s", "0,0,0,c", "0,0,0,-s", "0,0,s,0",
+  "0,0,c,0", "0,0,-s,0", "0,s,0,0", "0,c,0,0",
+  "0,-s,0,0", "s,0,0,0", "c,0,0,0", "-s,0,0,0",
+])
+
+def genindividual():
+  corpus = Corpus()
+
+  # vrot immediates are a paaaain
+  TESTS = corpus.family("vrot-imm")
+  for com in itertools.product(["0", "s", "c", "-s"], repeat=4):
+    arg = ",".join(com)
+    if arg not in buggy_toolchain:
+      TESTS.append("vrot.q R000.q, S100.s, [%s]" % arg)
+
+  for com in itertools.product(["0", "s", "c", "-s"], repeat=3):
+    TESTS.append("vrot.t R000.t, S100.s, [%s]" % ",".join(com))
+
+
+  # Exhaustive register naming test
+  TESTS = corpus.family("regnames")
+  for mtx in range(9):
+    for col in range(5):
+      for row in range(5):
+        TESTS.append("vadd.s S%u%u%u.s, S000.s, S000.s" % (mtx, col, row))
+
+  for mode in "ptq":
+    for mtx in range(9):
+      for col in range(5):
+        for row in range(5):
+          for t in "CRcr":
+            TESTS.append("vadd.%s %s%u%u%u.%s, %s000.%s, %s000.%s" % (
+                         mode, t, mtx, col, row, mode, t, mode, t, mode))
+
+  for mode in "ptq":
+    for mtx in range(9):
+      for col in range(5):
+        for row in range(5):
+          for t in "MEme":
+            TESTS.append("vmmov.%s %s%u%u%u.%s, %s100.%s" % (
+                         mode, t, mtx, col, row, mode, t, mode))
+            # vmmul is a bit special with register VS
+            TESTS.append("vmmul.%s %s200.%s, %s%u%u%u.%s, %s100.%s" % (
+                         mode, t, mode, t, mtx, col, row, mode, t, mode))
+            TESTS.append("vmmul.%s %s200.%s, %s100.%s, %s%u%u%u.%s" % (
+                         mode, t, mode, t, mode, t, mtx, col, row, mode))
+
+  # Check register collision. Should agree.
+  TESTS = corpus.family("collision")
+  for mode in "ptq":
+    for mtx1 in range(8):
+      for col1 in range(4):
+        for row1 in range(4):
+          for t1 in "CR":
+            for mtx2 in range(8):
+              for col2 in range(4):
+                for row2 in range(4):
+                  for t2 in "CR":
+                    TESTS.append("vmmul.%s %s%u%u%u.%s, %s%u%u%u.%s, %s000.%s" % (
+                                 mode, t, mtx1, col1, row1, mode, t, mtx2, col2, row2, mode, t, mode))
+                    TESTS.append("vmmul.%s %s%u%u%u.%s, %s000.%s, %s%u%u%u.%s" % (
+                                 mode, t, mtx1, col1, row1, mode, t, mode, t, mtx2, col2, row2, mode))
+
+  return corpus
+
+
+# Negative tests: every family is a rule that builds invalid instructions
+# and the diagnostic (regex) that the assembler is expected to produce.
+ERRRULES = collections.OrderedDict([
+  ("wrong-size",      "register type mismatch"),
+  ("conflict",        "register conflict"),
+  ("swizzle-range",   "swizzle.*out of range"),
+  ("prefix-too-many", "mismatched prefix size.*too many"),
+  ("prefix-too-few",  "mismatched prefix size.*too few"),
+  ("viim-range",      "out of range"),
+  ("vwbn-range",      "out of range"),
+  ("vsync-range",     "out of range"),
+])
+
+# Returns the (matrix, column, row) elements a register name covers
+def regelems(reg):
+  name, mode = reg.split(".")
+  n = {"s": 1, "p": 2, "t": 3, "q": 4}[mode]
+  mtx, col, row = int(name[1]), int(name[2]), int(name[3])
+  if name[0] == "R":
+    return set((mtx, col + i, row) for i in range(n))
+  return set((mtx, col, row + i) for i in range(n))
+
+def generrors():
+  corpus = Corpus()
+
+  # Registers of a different size than the instruction suffix
+  TESTS = corpus.family("wrong-size")
+  for op in OPS3:
+    for mode in "sptq":
+      good = next(genregs(mode))
+      for bmode in "sptq".replace(mode, ""):
+        for reg in genregs(bmode):
+          for regs in [(reg, good, good), (good, reg, good), (good, good, reg)]:
+            TESTS.append("v%s.%s %s, %s, %s" % ((op, mode) + regs))
+
+  # Destination partially overlapping the source
+  TESTS = corpus.family("conflict")
+  for op in ["rcp", "rsq", "sin", "cos", "exp2", "log2", "sqrt", "asin", "nrcp", "nsin", "rexp2"]:
+    for mode in "ptq":
+      for regd in genregs(mode):
+        for regs in genregs(mode):
+          if regd != regs and regelems(regd) & regelems(regs):
+            TESTS.append("v%s.%s %s, %s" % (op, mode, regd, regs))
+
+  # Swizzle channels beyond the vector size
+  TESTS = corpus.family("swizzle-range")
+  for op in OPS3:
+    for atype, regpfx, N in [("t", "R", 3), ("p", "R", 2), ("s", "S", 1)]:
+      for lane in range(N):
+        for ch in ["x","y","z","w"][N:]:
+          for neg in "- ":
+            for ab in "| ":
+              exp = ["x"] * N
+              exp[lane] = "%s%s%s%s" % (neg, ab, ch, ab)
+              exp = ",".join(exp)
+              TESTS.append("v%s.%s %s000, %s100, %s200[%s]" % (op, atype, regpfx, regpfx, regpfx, exp))
+              TESTS.append("v%s.%s %s000, %s100[%s], %s200" % (op, atype, regpfx, regpfx, exp, regpfx))
+
+  # Prefixes with the wrong number of lanes
+  for op in OPS3:
+    for atype, regpfx, N in [("q", "R", 4), ("t", "R", 3), ("p", "R", 2), ("s", "S", 1)]:
+      for cnt in range(1, 5):
+        if cnt == N:
+          continue
+        TESTS = corpus.family("prefix-too-many" if cnt > N else "prefix-too-few")
+        for lane in ["x", "-x", "|x|", "0", "1/2"]:
+          exp = ",".join([lane] * cnt)
+          TESTS.append("v%s.%s %s000, %s100, %s200[%s]" % (op, atype, regpfx, regpfx, regpfx, exp))
+          TESTS.append("v%s.%s %s000, %s100[%s], %s200" % (op, atype, regpfx, regpfx, exp, regpfx))
+
+  # Immediates out of range
+  TESTS = corpus.family("viim-range")
+  for regd in genregs("s"):
+    for imm in range(1 << 16, 1 << 24, 65537 * 3):
+      TESTS.append("viim.s %s, %d" % (regd, imm))
+      TESTS.append("viim.s %s, %d" % (regd, -imm // 2 - 1))
+
+  TESTS = corpus.family("vwbn-range")
+  for regd in genregs("s"):
+    for imm in range(256, 65536, 257 * 7):
+      TESTS.append("vwbn.s %s, %s, %d" % (regd, regd, imm))
+      TESTS.append("vwbn.s %s, %s, 0x%x" % (regd, regd, imm))
+
+  TESTS = corpus.family("vsync-range")
+  for imm in range(1 << 16, 1 << 20, 4099):
+    TESTS.append("vsync %d" % imm)
+    TESTS.append("vsync 0x%x" % imm)
+
+  return corpus